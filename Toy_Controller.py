@@ -1,25 +1,48 @@
 import flet as ft
 import asyncio
-import json
 import logging
+import logging.handlers
+import queue
+import atexit
+import os
+import pathlib
+import orjson
 import websockets
 import math
+import random
+import functools
+import threading
 import time
 import config
 from buttplug import WebsocketConnector
 from buttplug.client import Client, Device
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(log_formatter)
 file_handler = logging.FileHandler(config.LOG_FILE, mode='w', encoding='utf-8')
-file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(file_formatter)
-logging.getLogger().addHandler(file_handler)
+file_handler.setFormatter(log_formatter)
+# ワーカーのログ出力でイベントループが止まらないよう、実際の書き込みは QueueListener のスレッドで行う
+log_queue = queue.SimpleQueue()
+logging.getLogger().setLevel(logging.INFO)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # --- グローバル変数 ---
 cli = None
-is_shutting_down = False
-background_tasks = set()
-pose_event_queue = asyncio.Queue()
+shutdown_event = asyncio.Event()
+# ポーズは最新のハッシュだけが意味を持つので、キューではなく最新値1つと Event で PoseWorker に知らせる
+latest_pose_hash = 0
+pose_changed_event = asyncio.Event()
+piston_mode_event = asyncio.Event()
+vibe_mode_event = asyncio.Event()
+# 状態が変わるたびに update_activity_events() で set/clear し、ワーカーは何もできない間これを待つ
+pose_clear_event = asyncio.Event()
+piston_active_event = asyncio.Event()
+vibe_active_event = asyncio.Event()
+idle_allowed_event = asyncio.Event()
 is_post_climax_cooldown = False
 is_wireless_mode = False
 is_idle_motion_enabled = False
@@ -27,60 +50,159 @@ idle_motion_interval = 4.0
 is_slider_dragging = False
 
 page_ref = None
+ui_scheduler = None
 piston_gauge_ref = None
 vibe_gauge_ref = None
 
 managed_devices = {}
 signal_assignments = {"piston": None, "vibe": None}
+# signal_assignments / managed_devices を書き換えたら mark_assignments_changed() で増やす。ワーカーはこれが変わった時だけデバイスを引き直す
+assignments_version = 0
+# 割り当て先のデバイスが無いワーカーは、これが set されるまで待つ
+assignments_changed_event = asyncio.Event()
 
 current_piston_mode = 0
 current_vibe_mode = 0
 current_progress = 0.0
 current_animation_hash = 0
 
-def save_config():
-    config_data = {
-        "piston_speed": {str(k): v for k, v in config.PISTON_SPEED_MAP.items()},
+# ポーズ/絶頂のハッシュ集合。キーの追加削除は起きない(範囲だけが変わる)ので起動時に一度だけ作る
+POSE_HASHES = frozenset(config.POSE_PROFILES)
+CLIMAX_HASHES = frozenset(config.CLIMAX_HASHES)
+BLOCKING_HASHES = POSE_HASHES | CLIMAX_HASHES
+POSE_ONLY_HASHES = POSE_HASHES - CLIMAX_HASHES
+
+# アイドル動作用の正弦波テーブル ((sin+1)/2 を1周期 _SIN_TABLE_SIZE 分割)
+_SIN_TABLE_SIZE = 1024
+_SIN_TABLE = tuple((math.sin(2 * math.pi * i / _SIN_TABLE_SIZE) + 1) * 0.5 for i in range(_SIN_TABLE_SIZE))
+
+_speed_fmt = "Mode {m} ({tier}) Interval: {v:.1f}s".format
+PISTON_SPEED_TIERS = {1: "Low", 2: "Medium", 3: "High"}
+VIBE_TIERS = {1: "Low", 2: "High"}
+# Padding はコントロールではなく値オブジェクトなので共有できる。Divider や Icon は親を1つしか持てないため共有しない
+CARD_PADDING = ft.padding.only(left=15, top=10, right=15, bottom=10)
+
+SAVE_DEBOUNCE_SECONDS = 0.5
+SHUTDOWN_TIMEOUT_SECONDS = 5.0
+_save_handle = None
+_save_task = None
+# 書き込みは複数のスレッドから重なり得る(遅延保存・save_config・最終保存)。同じ .tmp を使うので書き込みと置き換えを直列化する
+_save_file_lock = threading.Lock()
+_last_saved_config = None
+
+# --- ポーズプロファイル ---
+class PoseProfile:
+    # 50Hzで読まれるので dict ではなく __slots__ の属性アクセスにする。範囲はUIから書き換えるためミュータブル
+    __slots__ = ("name", "min_pos", "max_pos", "pattern", "is_constant_freq", "cycle_duration", "cycle_ns")
+
+    def __init__(self, name: str, min_pos: float, max_pos: float, pattern, is_constant_freq: bool = False, cycle_duration: float = 0.0):
+        self.name = name
+        self.min_pos = min_pos
+        self.max_pos = max_pos
+        self.pattern = pattern
+        self.is_constant_freq = is_constant_freq
+        self.cycle_duration = cycle_duration
+        # 一定周期の進捗は monotonic_ns の整数剰余で求める
+        self.cycle_ns = int(cycle_duration * 1e9)
+
+def _build_pose_profiles():
+    config.POSE_PROFILES = {
+        pose_id: (profile if isinstance(profile, PoseProfile) else PoseProfile(**profile))
+        for pose_id, profile in config.POSE_PROFILES.items()
+    }
+
+def _build_config_data():
+    # int キーは orjson の OPT_NON_STR_KEYS で文字列化される。
+    # 前回保存分との比較に使うので、各マップは参照ではなくコピーを持つ
+    return {
+        "piston_speed": dict(config.PISTON_SPEED_MAP),
         "piston_range": {"min": config.piston_pos_min, "max": config.piston_pos_max},
-        "vibe_strength": {str(k): v for k, v in config.VIBE_STRENGTH_MAP.items()},
-        "vibe_min_strength": {str(k): v for k, v in config.VIBE_MIN_STRENGTH_MAP.items()},
-        "vibe_as_piston_speed": {str(k): v for k, v in config.VIBE_AS_PISTON_SPEED_MAP.items()},
+        "vibe_strength": dict(config.VIBE_STRENGTH_MAP),
+        "vibe_min_strength": dict(config.VIBE_MIN_STRENGTH_MAP),
+        "vibe_as_piston_speed": dict(config.VIBE_AS_PISTON_SPEED_MAP),
         "vibe_as_piston_range": {"min": config.vibe_as_piston_pos_min, "max": config.vibe_as_piston_pos_max},
         "pose_ranges": {
-            str(pose_id): {"min": profile["min_pos"], "max": profile["max_pos"]}
+            pose_id: {"min": profile.min_pos, "max": profile.max_pos}
             for pose_id, profile in config.POSE_PROFILES.items()
         }
     }
+
+def _write_config_file(config_data):
+    tmp_path = config.CONFIG_FILE + ".tmp"
+    payload = orjson.dumps(config_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    with _save_file_lock:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, config.CONFIG_FILE)
+
+def save_config():
+    # イベントループ上から呼ばれた場合はファイル書き込みをスレッドに逃がす
+    global _last_saved_config, _save_task
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        _save_task = loop.create_task(save_config_async())
+        return
+    config_data = _build_config_data()
+    try:
+        _write_config_file(config_data)
+        _last_saved_config = config_data
+    except Exception as e:
+        logging.error(f"設定ファイルの保存中にエラーが発生しました: {e}")
+
+async def save_config_async():
+    global _last_saved_config
+    config_data = _build_config_data()
     try:
-        with open(config.CONFIG_FILE, 'w') as f:
-            json.dump(config_data, f, indent=4)
+        await asyncio.to_thread(_write_config_file, config_data)
+        _last_saved_config = config_data
     except Exception as e:
         logging.error(f"設定ファイルの保存中にエラーが発生しました: {e}")
 
+# --- 保存の遅延実行 ---
+def _do_save():
+    global _save_handle, _save_task
+    _save_handle = None
+    if _build_config_data() == _last_saved_config:
+        return
+    _save_task = asyncio.create_task(save_config_async())
+
+def _reschedule_save():
+    global _save_handle
+    if _save_handle:
+        _save_handle.cancel()
+    _save_handle = asyncio.get_running_loop().call_later(SAVE_DEBOUNCE_SECONDS, _do_save)
+
+def schedule_save():
+    # スライダーのイベントはスレッドで実行されるため、イベントループ側でタイマーを再設定する
+    page_ref.loop.call_soon_threadsafe(_reschedule_save)
+
 def load_config():
+    _build_pose_profiles()
     try:
-        with open(config.CONFIG_FILE, 'r') as f:
-            loaded_data = json.load(f)
+        loaded_data = orjson.loads(pathlib.Path(config.CONFIG_FILE).read_bytes())
         
         default_piston_speed = {1: 0.9, 2: 0.5, 3: 0.4}
-        loaded_piston_speed = {int(k): v for k, v in loaded_data.get("piston_speed", {}).items()}
-        config.PISTON_SPEED_MAP = {**default_piston_speed, **loaded_piston_speed}
+        default_piston_speed.update((int(k), v) for k, v in loaded_data.get("piston_speed", {}).items())
+        config.PISTON_SPEED_MAP = default_piston_speed
 
         piston_range = loaded_data.get("piston_range", {})
         config.piston_pos_min = piston_range.get("min", 0.0)
         config.piston_pos_max = piston_range.get("max", 0.8)
 
         default_vibe_strength = {1: 0.5, 2: 1.0}
-        loaded_vibe_strength = {int(k): v for k, v in loaded_data.get("vibe_strength", {}).items()}
-        config.VIBE_STRENGTH_MAP = {**default_vibe_strength, **loaded_vibe_strength}
+        default_vibe_strength.update((int(k), v) for k, v in loaded_data.get("vibe_strength", {}).items())
+        config.VIBE_STRENGTH_MAP = default_vibe_strength
 
         default_vibe_min_strength = {1: 0.1, 2: 0.2}
-        loaded_vibe_min_strength = {int(k): v for k, v in loaded_data.get("vibe_min_strength", {}).items()}
-        config.VIBE_MIN_STRENGTH_MAP = {**default_vibe_min_strength, **loaded_vibe_min_strength}
+        default_vibe_min_strength.update((int(k), v) for k, v in loaded_data.get("vibe_min_strength", {}).items())
+        config.VIBE_MIN_STRENGTH_MAP = default_vibe_min_strength
 
         default_vaps_speed = {1: 0.9, 2: 0.4}
-        loaded_vaps_speed = {int(k): v for k, v in loaded_data.get("vibe_as_piston_speed", {}).items()}
-        config.VIBE_AS_PISTON_SPEED_MAP = {**default_vaps_speed, **loaded_vaps_speed}
+        default_vaps_speed.update((int(k), v) for k, v in loaded_data.get("vibe_as_piston_speed", {}).items())
+        config.VIBE_AS_PISTON_SPEED_MAP = default_vaps_speed
 
         vaps_range = loaded_data.get("vibe_as_piston_range", {})
         config.vibe_as_piston_pos_min = vaps_range.get("min", 0.0)
@@ -89,152 +211,319 @@ def load_config():
         loaded_pose_ranges = loaded_data.get("pose_ranges", {})
         for pose_id_str, ranges in loaded_pose_ranges.items():
             pose_id = int(pose_id_str)
-            if pose_id in config.POSE_PROFILES:
-                config.POSE_PROFILES[pose_id]["min_pos"] = ranges.get("min", config.POSE_PROFILES[pose_id]["min_pos"])
-                config.POSE_PROFILES[pose_id]["max_pos"] = ranges.get("max", config.POSE_PROFILES[pose_id]["max_pos"])
+            profile = config.POSE_PROFILES.get(pose_id)
+            if profile is not None:
+                profile.min_pos = ranges.get("min", profile.min_pos)
+                profile.max_pos = ranges.get("max", profile.max_pos)
         
         logging.info(f"{config.CONFIG_FILE} was loaded successfully.")
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+    except (FileNotFoundError, orjson.JSONDecodeError) as e:
         logging.warning(f"Failed to load {config.CONFIG_FILE} ({e}). A new file will be created with default settings.")
         save_config()
 
+# --- 状態イベント ---
+def update_activity_events():
+    is_blocked = current_animation_hash in BLOCKING_HASHES
+    is_idle_allowed = (is_idle_motion_enabled and not is_slider_dragging and not is_blocked
+                       and current_piston_mode == 0 and current_vibe_mode == 0)
+    for event, flag in ((pose_clear_event, not is_blocked), (piston_active_event, current_piston_mode > 0),
+                        (vibe_active_event, current_vibe_mode > 0), (idle_allowed_event, is_idle_allowed)):
+        if flag: event.set()
+        else: event.clear()
+
+def mark_assignments_changed():
+    global assignments_version
+    assignments_version += 1
+    # デバイス選択のハンドラはスレッドで動くので、Event の set はイベントループ側で行う
+    page_ref.loop.call_soon_threadsafe(assignments_changed_event.set)
+
+async def sleep_unless_shutdown(delay):
+    # 再試行待ちなどの長めの待機は、終了通知が来たらすぐに切り上げる
+    try:
+        await asyncio.wait_for(shutdown_event.wait(), timeout=delay)
+    except asyncio.TimeoutError:
+        pass
+
+RETRY_INITIAL_DELAY, RETRY_MAX_DELAY = 1.0, 30.0
+
+async def backoff_sleep(delay):
+    # 接続失敗が続くほど再試行間隔を倍々に伸ばす。ジッターで再試行のタイミングをずらし、次回の待ち時間を返す
+    await sleep_unless_shutdown(delay + random.random() * 0.5)
+    return min(delay * 2, RETRY_MAX_DELAY)
+
+# --- UI更新スケジューラ ---
+class UIUpdateScheduler:
+    # ワーカーからの更新は変更のあったコントロールだけ記録しておき、interval ごとにまとめて1回の page.update() で送る
+    def __init__(self, page: ft.Page, interval: float = 0.05):
+        self.page = page
+        self.interval = interval
+        self._dirty = set()
+        self._event = asyncio.Event()
+
+    def mark_dirty(self, *controls):
+        self._dirty.update(controls)
+        self._event.set()
+
+    def mark_dirty_threadsafe(self, *controls):
+        # Flet の同期ハンドラ(スライダー等)は別スレッドで動くので、記録はイベントループ側で行う
+        self.page.loop.call_soon_threadsafe(self.mark_dirty, *controls)
+
+    def set_value(self, control, value):
+        if control.value != value:
+            control.value = value
+            self.mark_dirty(control)
+
+    async def run(self):
+        while True:
+            await self._event.wait()
+            await asyncio.sleep(self.interval)
+            self._event.clear()
+            dirty = tuple(self._dirty)
+            self._dirty.clear()
+            if self.page.session:
+                try:
+                    self.page.update(*dirty)
+                except Exception as e:
+                    logging.warning(f"UIUpdateScheduler: update failed. Error: {e}")
+
+# 細かな浮動小数点の揺れで再描画しないよう、ゲージの値は小数点以下3桁に丸めてから比較する
+def set_piston_gauge(value):
+    if piston_gauge_ref: ui_scheduler.set_value(piston_gauge_ref, round(value, 3))
+
+def set_vibe_gauge(value):
+    if vibe_gauge_ref: ui_scheduler.set_value(vibe_gauge_ref, round(value, 3))
+
 # --- 点滅マネージャー ---
 class PulsingManager:
+    PULSED_OPACITY, NORMAL_OPACITY = 0.4, 1.0
+
     def __init__(self, page: ft.Page, interval: float = 0.8):
         self.page = page
         self.interval = interval
         self.controls = set()
-        self._task = None
+        # ティックごとに集合を走査しないよう、メンバー変更時にタプルへ写しておく
+        self._controls_snapshot = ()
+        self._handle = None
+        self._next_deadline = 0.0
         self._is_pulsed = False
-
-    async def _run(self):
-        try:
-            while self.controls:
-                loop_start_time = asyncio.get_event_loop().time()
-                self._is_pulsed = not self._is_pulsed
-                opacity = 0.4 if self._is_pulsed else 1.0
-                for control in self.controls:
-                    control.opacity = opacity
-                if self.page.session:
-                    try:
-                        self.page.update()
-                    except Exception as e:
-                        logging.warning(f"PulsingManager: page.update() failed, stopping pulse. Error: {e}")
-                        break
-                elapsed = asyncio.get_event_loop().time() - loop_start_time
-                sleep_duration = max(0, self.interval - elapsed)
-                await asyncio.sleep(sleep_duration)
-        except asyncio.CancelledError:
-            pass
-        finally:
-            for control in self.controls:
-                control.opacity = 1.0
-            if self.page.session:
-                try:
-                    self.page.update()
-                except Exception:
-                    pass
-            self._task = None
+        self._last_opacity = self.NORMAL_OPACITY
+
+    def _tick(self):
+        self._handle = None
+        controls = self._controls_snapshot
+        if not controls:
+            return
+        self._is_pulsed = not self._is_pulsed
+        op = self.PULSED_OPACITY if self._is_pulsed else self.NORMAL_OPACITY
+        for control in controls:
+            control.opacity = op
+        self._last_opacity = op
+        ui_scheduler.mark_dirty(*controls)
+        loop = asyncio.get_running_loop()
+        self._next_deadline = max(self._next_deadline + self.interval, loop.time())
+        self._handle = loop.call_at(self._next_deadline, self._tick)
 
     def add(self, *controls: ft.Text):
         self.controls.update(controls)
-        if not self._task or self._task.done():
+        self._controls_snapshot = tuple(self.controls)
+        if self._handle is None:
             self._is_pulsed = False
-            self._task = asyncio.create_task(self._run())
-            background_tasks.add(self._task)
+            self._next_deadline = asyncio.get_running_loop().time()
+            self._tick()
 
-    def remove(self, *controls: ft.Text):
+    def _reset(self, controls):
+        # 直前のティックで不透明度が1.0に戻っていれば、リセットと更新は不要
+        if not controls or self._last_opacity == self.NORMAL_OPACITY:
+            return
         for control in controls:
-            if control in self.controls:
-                self.controls.remove(control)
-                control.opacity = 1.0
-        if not self.controls and self._task and not self._task.done():
-            self._task.cancel()
-        if self.page.session:
-            self.page.update()
+            control.opacity = self.NORMAL_OPACITY
+        ui_scheduler.mark_dirty(*controls)
+
+    def remove(self, *controls: ft.Text):
+        removed = [control for control in controls if control in self.controls]
+        self.controls.difference_update(removed)
+        self._controls_snapshot = tuple(self.controls)
+        if not self.controls and self._handle:
+            self._handle.cancel()
+            self._handle = None
+        self._reset(removed)
+        if not self.controls:
+            self._last_opacity = self.NORMAL_OPACITY
     
     def clear(self):
-        if self._task and not self._task.done():
-            self._task.cancel()
-        for control in self.controls:
-            control.opacity = 1.0
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        removed = self._controls_snapshot
         self.controls.clear()
-        if self.page.session:
-            self.page.update()
+        self._controls_snapshot = ()
+        self._reset(removed)
+        self._last_opacity = self.NORMAL_OPACITY
+
+# --- スロットル ---
+class Throttle:
+    def __init__(self, handler, interval: float = 0.06):
+        self.handler = handler
+        self.interval = interval
+        self._last_ts = 0.0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def __call__(self, e):
+        control = e.control
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_ts
+            is_edge = control.value in (control.min, control.max)
+            if not is_edge and elapsed < self.interval:
+                if self._pending is None:
+                    page_ref.loop.call_soon_threadsafe(self._schedule_flush, self.interval - elapsed)
+                self._pending = e
+                return
+            self._last_ts = now
+            self._pending = None
+        self.handler(e)
+
+    def _schedule_flush(self, delay: float):
+        asyncio.get_running_loop().call_later(delay, self._flush)
+
+    def _flush(self):
+        with self._lock:
+            e = self._pending
+            self._pending = None
+            if e is None:
+                return
+            self._last_ts = time.monotonic()
+        self.handler(e)
+
+# --- デバイス解決 ---
+_resolved_version = -1
+_piston_linear = None
+_vibe_linear = None
+_piston_is_shared = False
+_vibe_target = None
+# デバイスの capabilities は登録時に frozenset にしておき、未登録時の既定値もこれを共有する
+_EMPTY_CAPS = frozenset()
+
+def _linear_actuator_of(role):
+    device_index = signal_assignments.get(role)
+    if device_index is None: return None
+    device_info = managed_devices.get(device_index)
+    if device_info is None or 'piston' not in device_info["capabilities"]: return None
+    linear_actuators = device_info["device"].linear_actuators
+    return linear_actuators[0] if linear_actuators else None
+
+def _refresh_resolved():
+    # assignments_version が変わった時だけ割り当てを引き直し、各ワーカーはキャッシュを共有する
+    global _resolved_version, _piston_linear, _vibe_linear, _piston_is_shared, _vibe_target
+    _resolved_version = assignments_version
+    piston_device_index = signal_assignments.get("piston")
+    vibe_device_index = signal_assignments.get("vibe")
+    _piston_linear = _linear_actuator_of("piston")
+    _vibe_linear = _linear_actuator_of("vibe")
+    _piston_is_shared = piston_device_index is not None and piston_device_index == vibe_device_index
+
+    _vibe_target = None
+    device_info = managed_devices.get(vibe_device_index) if vibe_device_index is not None else None
+    if device_info:
+        capabilities = device_info["capabilities"]
+        is_linked_vibe_mode = _piston_is_shared and 'vibe' in capabilities
+        is_vibe_only_mode = 'vibe' in capabilities and not is_linked_vibe_mode
+        is_piston_as_vibe_mode = 'piston' in capabilities and 'vibe' not in capabilities
+        _vibe_target = (device_info["device"], is_linked_vibe_mode, is_vibe_only_mode, is_piston_as_vibe_mode)
+
+def resolve_piston_actuator(fallback_to_vibe=False, exclusive=False):
+    # fallback_to_vibe: ピストン未割り当て時に振動側のリニアデバイスを使う / exclusive: 振動と共有のデバイスは除外する
+    if _resolved_version != assignments_version: _refresh_resolved()
+    if exclusive and _piston_is_shared: return None
+    if _piston_linear is None and fallback_to_vibe: return _vibe_linear
+    return _piston_linear
+
+def resolve_vibe_target():
+    # (device, is_linked_vibe_mode, is_vibe_only_mode, is_piston_as_vibe_mode) か None を返す
+    if _resolved_version != assignments_version: _refresh_resolved()
+    return _vibe_target
 
 # --- ワーカー ---
+POS_EPSILON = 0.005
+POS_RESEND_INTERVAL = 0.2
+
+class PositionGate:
+    # 前回送信位置からほとんど動いていない指令は、一定時間が経つまで送らない
+    def __init__(self):
+        self.last_pos: float | None = None
+        self.last_at: float = 0.0
+
+    def should_send(self, position: float) -> bool:
+        now = time.monotonic()
+        if (self.last_pos is not None and abs(position - self.last_pos) < POS_EPSILON
+                and now - self.last_at < POS_RESEND_INTERVAL):
+            return False
+        self.last_pos = position
+        self.last_at = now
+        return True
+
 async def idle_worker():
 
     logging.info("Idle worker started.")
     was_idling = False
     target_position = 0.5
+    phase_interval = None
+    phase_scale = 0.0
+    position_gate = PositionGate()
+    loop = asyncio.get_running_loop()
+    wireless_deadline = None
 
-    while not is_shutting_down:
+    while not shutdown_event.is_set():
         try:
-            if is_slider_dragging:
-                await asyncio.sleep(0.1)
-                continue
-            if not is_idle_motion_enabled:
-                was_idling = False
-                await asyncio.sleep(0.5)
+            if not idle_allowed_event.is_set():
+                # スライダー操作中の一時停止ではスムーズな再開をやり直さない
+                if not is_slider_dragging: was_idling = False
+                await idle_allowed_event.wait()
                 continue
 
-            is_pose_active = current_animation_hash in config.POSE_PROFILES
-            is_climax_active = current_animation_hash in config.CLIMAX_HASHES
-            is_piston_mode_active = current_piston_mode > 0
-            is_vibe_mode_active = current_vibe_mode > 0
-
-            if is_pose_active or is_climax_active or is_piston_mode_active or is_vibe_mode_active:
-                was_idling = False
-                await asyncio.sleep(0.5)
-                continue
-
-            actuator = None
-            piston_device_index = signal_assignments.get("piston")
-            if piston_device_index is not None:
-                device_info = managed_devices.get(piston_device_index, {})
-                if 'piston' in device_info.get("capabilities", []):
-                    actuator = device_info.get("device").linear_actuators[0]
-            
-            if actuator is None:
-                vibe_device_index = signal_assignments.get("vibe")
-                if vibe_device_index is not None:
-                    device_info = managed_devices.get(vibe_device_index, {})
-                    if 'piston' in device_info.get("capabilities", []):
-                        actuator = device_info.get("device").linear_actuators[0]
-
+            assignments_changed_event.clear()
+            actuator = resolve_piston_actuator(fallback_to_vibe=True)
             if not actuator:
                 was_idling = False
-                await asyncio.sleep(0.5)
+                await assignments_changed_event.wait()
                 continue
             
             if is_wireless_mode:
                 duration_ms = int(idle_motion_interval * 1000)
+                period = idle_motion_interval + 0.2
+                # 送信の遅れが周期に積み重ならないよう締め切り基準で待つ。中断明けは今から数え直す
+                now = loop.time()
+                if wireless_deadline is None or now - wireless_deadline > period:
+                    wireless_deadline = now
                 
                 target_position = config.piston_pos_max if target_position == config.piston_pos_min else config.piston_pos_min
 
                 await actuator.command(position=target_position, duration=duration_ms)
-                if piston_gauge_ref and page_ref and page_ref.session:
-                    piston_gauge_ref.value = target_position; page_ref.update()
+                set_piston_gauge(target_position)
 
-                await asyncio.sleep(idle_motion_interval + 0.2)
+                wireless_deadline += period
+                await asyncio.sleep(max(0.0, wireless_deadline - loop.time()))
 
             else:
-                speed = math.pi / idle_motion_interval if idle_motion_interval > 0 else 0
-                position = (math.sin(time.monotonic() * speed) + 1) / 2.0
+                # sin(t * pi / interval) の1周期は 2 * interval 秒なので、経過時間をテーブルの添字に換算する
+                if idle_motion_interval != phase_interval:
+                    phase_interval = idle_motion_interval
+                    phase_scale = _SIN_TABLE_SIZE / (2 * idle_motion_interval) if idle_motion_interval > 0 else 0.0
+                position = _SIN_TABLE[int(time.monotonic() * phase_scale) & (_SIN_TABLE_SIZE - 1)]
                 mapped_position = config.piston_pos_min + (position * (config.piston_pos_max - config.piston_pos_min))
 
                 if not was_idling:
                     logging.info("Idle motion starting smoothly.")
                     await actuator.command(position=mapped_position, duration=500)
+                    position_gate.should_send(mapped_position)
                     await asyncio.sleep(0.5)
                     was_idling = True
 
-                if piston_gauge_ref and page_ref and page_ref.session:
-                    piston_gauge_ref.value = mapped_position
-                    page_ref.update()
+                set_piston_gauge(mapped_position)
                 
-                await actuator.command(position=mapped_position, duration=150)
+                if position_gate.should_send(mapped_position):
+                    await actuator.command(position=mapped_position, duration=150)
                 await asyncio.sleep(0.1)
 
         except asyncio.CancelledError:
@@ -242,106 +531,100 @@ async def idle_worker():
         except Exception as e:
             logging.error(f"Error in idle_worker: {e}")
             was_idling = False
-            await asyncio.sleep(1)
+            await sleep_unless_shutdown(1)
 
 async def piston_worker():
-    is_homed = True
-    target_position = config.piston_pos_max
-    while not is_shutting_down:
+    is_homed: bool = True
+    going_up: bool = True
+    # マップはスライダーで中身だけ書き換わるので、.get は起動時に一度だけ束縛しておく
+    piston_speed_get = config.PISTON_SPEED_MAP.get
+    loop = asyncio.get_running_loop()
+    stroke_deadline: float | None = None
+    while not shutdown_event.is_set():
         try:
-            if (current_animation_hash in config.POSE_PROFILES):
-                await asyncio.sleep(0.1)
-                continue
-
-            if current_animation_hash in config.CLIMAX_HASHES:
-                await asyncio.sleep(0.1)
+            if not pose_clear_event.is_set():
+                await pose_clear_event.wait()
                 continue
 
-            device_index = signal_assignments.get("piston")
-
-            if device_index is None:
-                await asyncio.sleep(0.02)
-                continue
-
-            device_info = managed_devices.get(device_index, {})
-            capabilities = device_info.get("capabilities", [])
-
-            if 'piston' not in capabilities:
-                await asyncio.sleep(0.02)
-                continue
-
-            if device_index is not None and device_index == signal_assignments.get("vibe"):
-                await asyncio.sleep(0.05)
+            # 振動と同じデバイスに割り当てられている場合は vibe_worker 側が動かす
+            # 割り当てが無ければ、割り当てかデバイス一覧が変わるまで待つ。確認の直前に clear して通知の取りこぼしを防ぐ
+            assignments_changed_event.clear()
+            actuator = resolve_piston_actuator(exclusive=True)
+            if actuator is None:
+                await assignments_changed_event.wait()
                 continue
-                
-            actuator = managed_devices.get(device_index, {}).get("device", {}).linear_actuators[0] if device_index is not None else None
 
+            # このイテレーションで読んだモード以降の変更だけを待機中に検知する
+            piston_mode_event.clear()
             if current_piston_mode > 0 and actuator:
                 is_homed = False
-                interval = config.PISTON_SPEED_MAP.get(current_piston_mode, 1.0)
+                interval = piston_speed_get(current_piston_mode, 1.0)
+                # 可動範囲はストロークごとに1回だけ読み、スライダーの変更は次のストロークから反映する
+                target_position = config.piston_pos_max if going_up else config.piston_pos_min
+                # ストロークの区切りは締め切り基準にして、送信の遅れでリズムがずれないようにする
+                now = loop.time()
+                if stroke_deadline is None or now - stroke_deadline > interval:
+                    stroke_deadline = now
 
-                if piston_gauge_ref and page_ref and page_ref.session:
-                    piston_gauge_ref.value = target_position
-                    page_ref.update()
+                set_piston_gauge(target_position)
 
                 await actuator.command(position=target_position, duration=int(interval * 1000))
-                target_position = config.piston_pos_min if target_position == config.piston_pos_max else config.piston_pos_max
-                await asyncio.sleep(interval)
+                going_up = not going_up
+                stroke_deadline += interval
+                try:
+                    await asyncio.wait_for(piston_mode_event.wait(), timeout=max(0.0, stroke_deadline - loop.time()))
+                    # モードが変わったら次のストロークから数え直す
+                    stroke_deadline = None
+                except asyncio.TimeoutError:
+                    pass
             elif current_piston_mode == 0 and not is_homed and actuator:
                 logging.info("Piston mode is off. Returning to home position.")
 
-                if piston_gauge_ref and page_ref and page_ref.session:
-                    piston_gauge_ref.value = 0.5
-                    page_ref.update()
+                set_piston_gauge(0.5)
 
                 await actuator.command(position=0.5, duration=700)
                 is_homed = True
-                target_position = config.piston_pos_max
+                going_up = True
                 await asyncio.sleep(0.05)
 
             else:
-                await asyncio.sleep(0.05)
+                await piston_active_event.wait()
         except (asyncio.CancelledError, KeyError, IndexError): break
-        except Exception as e: logging.error(f"ピストン制御中にエラー: {e}"); await asyncio.sleep(1)
+        except Exception as e: logging.error(f"ピストン制御中にエラー: {e}"); await sleep_unless_shutdown(1)
+
+# 強度は設定マップの離散的な値の組み合わせになるので、ランプの値列はメモ化して使い回す
+@functools.lru_cache(maxsize=64)
+def _ramp(start: float, end: float, n: int) -> tuple:
+    step = (end - start) / (n - 1)
+    return tuple(round(start + step * i, 2) for i in range(n))
 
 async def vibe_worker():
     is_homed = True
     target_position = None
     wave_state_is_high = True
-
-    while not is_shutting_down:
+    last_sent = None
+    piston_speed_get = config.PISTON_SPEED_MAP.get
+    vibe_strength_get = config.VIBE_STRENGTH_MAP.get
+    vibe_min_strength_get = config.VIBE_MIN_STRENGTH_MAP.get
+    vaps_speed_get = config.VIBE_AS_PISTON_SPEED_MAP.get
+    loop = asyncio.get_running_loop()
+
+    while not shutdown_event.is_set():
         try:
-
-            vibe_device_index = signal_assignments.get("vibe")
-            piston_device_index = signal_assignments.get("piston")
-
-            if vibe_device_index is None:
-                await asyncio.sleep(0.05)
+            assignments_changed_event.clear()
+            vibe_target = resolve_vibe_target()
+            if vibe_target is None:
+                await assignments_changed_event.wait()
                 continue
-
-            device_info = managed_devices.get(vibe_device_index)
-            if not device_info:
-                await asyncio.sleep(0.05)
-                continue
-            
-            device = device_info["device"]
-            capabilities = device_info["capabilities"]
-            
-            is_linked_vibe_mode = (piston_device_index is not None and 
-                                   piston_device_index == vibe_device_index and 
-                                   'vibe' in capabilities)
-
-            is_vibe_only_mode = 'vibe' in capabilities and not is_linked_vibe_mode
-
-            is_piston_as_vibe_mode = 'piston' in capabilities and 'vibe' not in capabilities
+            device, is_linked_vibe_mode, is_vibe_only_mode, is_piston_as_vibe_mode = vibe_target
 
             if is_linked_vibe_mode:
                 is_homed = True
                 vibrator = device.actuators[0]
 
-                piston_interval = config.PISTON_SPEED_MAP.get(current_piston_mode, 1.0)
-                max_strength = config.VIBE_STRENGTH_MAP.get(current_vibe_mode, 0.0)
-                min_strength = config.VIBE_MIN_STRENGTH_MAP.get(current_vibe_mode, 0.0)
+                piston_interval = piston_speed_get(current_piston_mode, 1.0)
+                max_strength = vibe_strength_get(current_vibe_mode, 0.0)
+                min_strength = vibe_min_strength_get(current_vibe_mode, 0.0)
                 
                 if min_strength > max_strength:
                     min_strength = max_strength
@@ -353,49 +636,62 @@ async def vibe_worker():
                     start_strength = min_strength if wave_state_is_high else max_strength
                     end_strength = max_strength if wave_state_is_high else min_strength
                     
-                    for i in range(TOTAL_STEPS):
-                        progress = i / (TOTAL_STEPS - 1)
-                        current_strength = start_strength + (end_strength - start_strength) * progress
-
-                        if vibe_gauge_ref and page_ref and page_ref.session:
-                            vibe_gauge_ref.value = round(current_strength, 2)
-                            page_ref.update()
-
-                        await vibrator.command(round(current_strength, 2))
-                        await asyncio.sleep(step_interval)
-                    
-                    await vibrator.command(end_strength)
+                    last_step = None
+                    is_interrupted = False
+                    ramp_modes = (current_piston_mode, current_vibe_mode)
+                    step_deadline = loop.time()
+                    for current_strength in _ramp(start_strength, end_strength, TOTAL_STEPS):
+                        # ゲーム側でモードが変わったらランプを最後まで待たずに打ち切り、新しいパラメータでやり直す
+                        if (current_piston_mode, current_vibe_mode) != ramp_modes:
+                            is_interrupted = True; break
+                        if current_strength != last_step:
+                            set_vibe_gauge(current_strength)
+                            await vibrator.command(current_strength)
+                            last_step = current_strength
+                        step_deadline += step_interval
+                        await asyncio.sleep(max(0.0, step_deadline - loop.time()))
+
+                    if is_interrupted:
+                        last_sent = (vibrator, last_step)
+                        continue
+
+                    # ランプの最終ステップと同じ値なら締めの送信は不要
+                    final_strength = round(end_strength, 2)
+                    if final_strength != last_step:
+                        await vibrator.command(final_strength)
+                    last_sent = (vibrator, final_strength)
 
                     wave_state_is_high = not wave_state_is_high
 
-                elif current_piston_mode == 0 and current_vibe_mode > 0:
-                    if vibe_gauge_ref and page_ref and page_ref.session:
-                        vibe_gauge_ref.value = max_strength
-                        page_ref.update()
-                    await vibrator.command(max_strength)
-                    await asyncio.sleep(0.05)
-
                 else:
-                    if vibe_gauge_ref and page_ref and page_ref.session:
-                        vibe_gauge_ref.value = 0.0
-                        page_ref.update()
-                    await vibrator.command(0.0)
+                    target_strength = max_strength if current_piston_mode == 0 and current_vibe_mode > 0 else 0.0
+                    if last_sent != (vibrator, target_strength):
+                        set_vibe_gauge(target_strength)
+                        await vibrator.command(target_strength)
+                        last_sent = (vibrator, target_strength)
                     await asyncio.sleep(0.05)
             
             elif is_vibe_only_mode:
                 is_homed = True
                 vibrator = device.actuators[0]
-                target_strength = config.VIBE_STRENGTH_MAP.get(current_vibe_mode, 0.0)
-                if vibe_gauge_ref and page_ref and page_ref.session:
-                    vibe_gauge_ref.value = target_strength
-                    page_ref.update()
-                await vibrator.command(target_strength)
-                await asyncio.sleep(0.05)
+                vibe_mode_event.clear()
+                target_strength = vibe_strength_get(current_vibe_mode, 0.0)
+                if last_sent != (vibrator, target_strength):
+                    set_vibe_gauge(target_strength)
+                    await vibrator.command(target_strength)
+                    last_sent = (vibrator, target_strength)
+                # スライダーでの強度変更やデバイスの再割り当ても拾えるよう、タイムアウト付きで待機する
+                try:
+                    await asyncio.wait_for(vibe_mode_event.wait(), timeout=0.2)
+                except asyncio.TimeoutError:
+                    pass
 
             elif is_piston_as_vibe_mode:
+                last_sent = None
 
-                if (current_animation_hash in config.POSE_PROFILES):
-                    await asyncio.sleep(0.1)
+                # ポーズ中は PoseWorker、絶頂中は climax_worker が同じリニアを動かすので、piston_worker と同じく両方で止める
+                if not pose_clear_event.is_set():
+                    await pose_clear_event.wait()
                     continue
 
                 linear = device.linear_actuators[0]
@@ -403,24 +699,22 @@ async def vibe_worker():
                     if is_homed:
                         target_position = config.vibe_as_piston_pos_max
                     is_homed = False
-                    interval = config.VIBE_AS_PISTON_SPEED_MAP.get(current_vibe_mode, 1.0)
-                    if piston_gauge_ref and page_ref and page_ref.session:
-                        piston_gauge_ref.value = target_position
-                        page_ref.update()
-                    if vibe_gauge_ref and page_ref and page_ref.session:
-                        vibe_gauge_ref.value = 0.0
-                        page_ref.update()
+                    interval = vaps_speed_get(current_vibe_mode, 1.0)
+                    set_piston_gauge(target_position)
+                    set_vibe_gauge(0.0)
                     await linear.command(position=target_position, duration=int(interval * 1000))
                     target_position = config.vibe_as_piston_pos_min if target_position == config.vibe_as_piston_pos_max else config.vibe_as_piston_pos_max
                     await asyncio.sleep(interval)
                 elif not is_homed:
-                    if piston_gauge_ref and page_ref and page_ref.session:
-                        piston_gauge_ref.value = 0.5
-                        page_ref.update()
+                    set_piston_gauge(0.5)
                     await linear.command(position=0.5, duration=700)
                     is_homed = True
                 else:
-                    await asyncio.sleep(0.05)
+                    # デバイスの再割り当ても拾えるよう、タイムアウト付きで待機する
+                    try:
+                        await asyncio.wait_for(vibe_active_event.wait(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        pass
             else:
                 await asyncio.sleep(0.05)
 
@@ -428,64 +722,48 @@ async def vibe_worker():
             break
         except Exception as e: 
             logging.error(f"振動制御中にエラー: {e}")
-            await asyncio.sleep(1)
+            await sleep_unless_shutdown(1)
+
+# 絶頂時のグラフパターン: (位置, 移動時間ms, 次までの待機秒)
+CLIMAX_PATTERN = (
+    (0.1, 200, 0.25),
+    (0.35, 100, 0.25),
+    (0.1, 250, 0.25),
+    (0.55, 280, 0.25),
+    (0.7, 150, 0.2),
+    (0.1, 200, 0.2),
+)
+# 有線時の余韻: (振幅, 移動時間ms)
+REVERB_PATTERN = (
+    (0.2, 100),
+    (0.15, 110),
+    (0.1, 120),
+    (0.05, 140),
+)
 
 async def climax_worker():
     is_climax_active_last_frame = False
     
-    while not is_shutting_down:
+    while not shutdown_event.is_set():
         try:
-            is_climax_now = current_animation_hash in config.CLIMAX_HASHES
-            actuator = None
-
-            piston_device_index = signal_assignments.get("piston")
-            if piston_device_index is not None:
-                device_info = managed_devices.get(piston_device_index, {})
-                if 'piston' in device_info.get("capabilities", []):
-                    actuator = device_info.get("device").linear_actuators[0]
-            if actuator is None:
-                vibe_device_index = signal_assignments.get("vibe")
-                if vibe_device_index is not None:
-                    device_info = managed_devices.get(vibe_device_index, {})
-                    if 'piston' in device_info.get("capabilities", []):
-                        actuator = device_info.get("device").linear_actuators[0]
+            is_climax_now = current_animation_hash in CLIMAX_HASHES
+            actuator = resolve_piston_actuator(fallback_to_vibe=True)
 
             if is_climax_now and not is_climax_active_last_frame:
                 logging.info(f"Climax Animation Detected ({current_animation_hash})! Executing graph pattern.")
                 if actuator:
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.1; page_ref.update()
-                    await actuator.command(position=0.1, duration=200)
-                    await asyncio.sleep(0.25)
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.35; page_ref.update()
-                    await actuator.command(position=0.35, duration=100)
-                    await asyncio.sleep(0.25)
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.1; page_ref.update()
-                    await actuator.command(position=0.1, duration=250)
-                    await asyncio.sleep(0.25)
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.55; page_ref.update()
-                    await actuator.command(position=0.55, duration=280)
-                    await asyncio.sleep(0.25)
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.7; page_ref.update()
-                    await actuator.command(position=0.7, duration=150)
-                    await asyncio.sleep(0.2)
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.1; page_ref.update()
-                    await actuator.command(position=0.1, duration=200)
-                    await asyncio.sleep(0.2)
+                    for position, duration_ms, wait_s in CLIMAX_PATTERN:
+                        set_piston_gauge(position)
+                        await actuator.command(position=position, duration=duration_ms)
+                        await asyncio.sleep(wait_s)
 
                     if not is_wireless_mode:
                         logging.info("Wired mode: Executing reverberation pattern.")
-                        reverberation_pattern = [
-                            (0.2, 100),
-                            (0.15, 110),
-                            (0.1, 120),
-                            (0.05, 140)
-                        ]
-
-                        for amplitude, duration_ms in reverberation_pattern:
-                            if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = amplitude; page_ref.update()
+                        for amplitude, duration_ms in REVERB_PATTERN:
+                            set_piston_gauge(amplitude)
                             await actuator.command(position=amplitude, duration=duration_ms)
                             await asyncio.sleep(duration_ms / 1000.0)
-                            if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = 0.0; page_ref.update()
+                            set_piston_gauge(0.0)
                             await actuator.command(position=0.0, duration=duration_ms)
                             await asyncio.sleep(duration_ms / 1000.0)
                     else:
@@ -495,9 +773,7 @@ async def climax_worker():
                 logging.info("Climax ended. Slowly returning to home position.")
                 is_post_climax_cooldown = True
                 await actuator.command(position=0.5, duration=500)
-                if piston_gauge_ref and page_ref and page_ref.session:
-                    piston_gauge_ref.value = 0.5
-                    page_ref.update()
+                set_piston_gauge(0.5)
                 await asyncio.sleep(0.5)
 
                 is_post_climax_cooldown = False
@@ -513,50 +789,43 @@ async def climax_worker():
         except Exception as e:
             logging.error(f"絶頂制御中にエラー: {e}")
             is_climax_active_last_frame = False
-            await asyncio.sleep(0.5)
+            await sleep_unless_shutdown(0.5)
 
 class PoseWorker:
     def __init__(self):
-        self.state = "INACTIVE"
-        self.display_pos = 0.5
-        self.display_progress = 0.0
-        self.transition_smoothing_factor = 0.15
-        self.run_smoothing_factor = 0.1
-        self.transition_frame_count = 0
-        self.last_wireless_pos = -1
+        self.state: str = "INACTIVE"
+        self.display_pos: float = 0.5
+        self.display_progress: float = 0.0
+        self.transition_smoothing_factor: float = 0.15
+        self.run_smoothing_factor: float = 0.1
+        self.transition_frame_count: int = 0
+        self.last_wireless_pos: float = -1
+        self.position_gate: PositionGate = PositionGate()
 
     async def run(self):
         TRANSITION_DURATION_FRAMES = 25
 
-        while not is_shutting_down:
+        while not shutdown_event.is_set():
             try:
-                try:
-                    event = pose_event_queue.get_nowait()
-                    if event['type'] == 'POSE_CHANGED':
-                        new_hash = event['hash']
-                        if new_hash in config.POSE_PROFILES and new_hash not in config.CLIMAX_HASHES:
-                            if is_wireless_mode:
-                                if self.state != "RUNNING":
-                                    logging.info(f"State (Wireless) -> RUNNING for hash {new_hash}")
-                                    self.state = "RUNNING"
-                            else:
-                                if self.state != "TRANSITIONING":
-                                    logging.info(f"State (Wired) -> TRANSITIONING for hash {new_hash}")
-                                    self.state = "TRANSITIONING"
-                                    self.transition_frame_count = 0
+                if pose_changed_event.is_set():
+                    pose_changed_event.clear()
+                    new_hash = latest_pose_hash
+                    if new_hash in POSE_ONLY_HASHES:
+                        if is_wireless_mode:
+                            if self.state != "RUNNING":
+                                logging.info(f"State (Wireless) -> RUNNING for hash {new_hash}")
+                                self.state = "RUNNING"
                         else:
-                            if self.state != "INACTIVE":
-                                logging.info("State -> INACTIVE")
-                                self.state = "INACTIVE"
-                except asyncio.QueueEmpty:
-                    pass
+                            if self.state != "TRANSITIONING":
+                                logging.info(f"State (Wired) -> TRANSITIONING for hash {new_hash}")
+                                self.state = "TRANSITIONING"
+                                self.transition_frame_count = 0
+                    else:
+                        if self.state != "INACTIVE":
+                            logging.info("State -> INACTIVE")
+                            self.state = "INACTIVE"
                 
-                actuator = None
-                piston_device_index = signal_assignments.get("piston")
-                if piston_device_index is not None:
-                    device_info = managed_devices.get(piston_device_index, {})
-                    if 'piston' in device_info.get("capabilities", []):
-                        actuator = device_info.get("device").linear_actuators[0]
+                actuator = resolve_piston_actuator()
 
                 if self.state == "TRANSITIONING":
                     if not actuator: 
@@ -564,7 +833,7 @@ class PoseWorker:
 
                     self.transition_frame_count += 1
                     profile = config.POSE_PROFILES[current_animation_hash]
-                    pattern_function, pos_min, pos_max = profile['pattern'], profile['min_pos'], profile['max_pos']
+                    pattern_function, pos_min, pos_max = profile.pattern, profile.min_pos, profile.max_pos
 
                     target_progress = current_progress
                     distance = target_progress - (self.display_progress % 1.0)
@@ -575,10 +844,11 @@ class PoseWorker:
                     final_progress = self.display_progress % 1.0
                     mapped_position = pos_min + (pattern_function(final_progress) * (pos_max - pos_min))
                     
-                    await actuator.command(position=mapped_position, duration=200)
+                    if self.position_gate.should_send(mapped_position):
+                        await actuator.command(position=mapped_position, duration=200)
                     self.display_pos = mapped_position
 
-                    if piston_gauge_ref and page_ref and page_ref.session: piston_gauge_ref.value = self.display_pos; page_ref.update()
+                    set_piston_gauge(self.display_pos)
 
                     if self.transition_frame_count >= TRANSITION_DURATION_FRAMES:
                         logging.info("Transition finished. State -> RUNNING.")
@@ -589,13 +859,13 @@ class PoseWorker:
                         self.state = "INACTIVE"; continue
 
                     profile = config.POSE_PROFILES[current_animation_hash]
-                    pattern_function, pos_min, pos_max = profile['pattern'], profile['min_pos'], profile['max_pos']
+                    pattern_function, pos_min, pos_max = profile.pattern, profile.min_pos, profile.max_pos
                     
                     if is_wireless_mode:
                         target_progress_source = 0.0
-                        if profile.get("is_constant_freq", False):
-                            cycle_duration = profile["cycle_duration"]
-                            target_progress_source = (time.monotonic() / cycle_duration) % 1.0
+                        if profile.is_constant_freq:
+                            cycle_ns = profile.cycle_ns
+                            target_progress_source = (time.monotonic_ns() % cycle_ns) / cycle_ns
                         else:
                             target_progress_source = current_progress
 
@@ -605,16 +875,15 @@ class PoseWorker:
                             logging.info(f"Wireless mode: Position changed to {'MIN' if target_pos == pos_min else 'MAX'}")
                             duration_ms = 400
                             await actuator.command(position=target_pos, duration=duration_ms)
-                            if piston_gauge_ref and page_ref and page_ref.session:
-                                piston_gauge_ref.value = target_pos; page_ref.update()
+                            set_piston_gauge(target_pos)
                             self.last_wireless_pos = target_pos
 
                     else:
                         final_progress = 0.0
 
-                        if profile.get("is_constant_freq", False):
-                            cycle_duration = profile["cycle_duration"]
-                            final_progress = (time.monotonic() / cycle_duration) % 1.0
+                        if profile.is_constant_freq:
+                            cycle_ns = profile.cycle_ns
+                            final_progress = (time.monotonic_ns() % cycle_ns) / cycle_ns
                         else:
                             target_progress = current_progress
                             distance = target_progress - (self.display_progress % 1.0)
@@ -624,127 +893,208 @@ class PoseWorker:
                             final_progress = self.display_progress % 1.0
 
                         mapped_position = pos_min + (pattern_function(final_progress) * (pos_max - pos_min))
-                        await actuator.command(position=mapped_position, duration=50)
+                        if self.position_gate.should_send(mapped_position):
+                            await actuator.command(position=mapped_position, duration=50)
                         self.display_pos = mapped_position 
-                        if piston_gauge_ref and page_ref and page_ref.session: 
-                            piston_gauge_ref.value = mapped_position; page_ref.update()
+                        set_piston_gauge(mapped_position)
 
                 elif self.state == "INACTIVE":
-                    is_climax_now = current_animation_hash in config.CLIMAX_HASHES
+                    is_climax_now = current_animation_hash in CLIMAX_HASHES
                     if not is_climax_now:
                         target_pos = 0.5
                         if abs(self.display_pos - target_pos) > 0.01:
                             self.display_pos += (target_pos - self.display_pos) * self.transition_smoothing_factor
                             if actuator:
                                 await actuator.command(position=self.display_pos, duration=100)
-                await asyncio.sleep(0.02)
+                if self.state == "INACTIVE" and abs(self.display_pos - 0.5) <= 0.01:
+                    # ホーム位置に落ち着いていればやることはないので、次のポーズ変更イベントまで待機する
+                    await pose_changed_event.wait()
+                else:
+                    await asyncio.sleep(0.02)
             except asyncio.CancelledError: break
             except Exception as e:
                 logging.error(f"Error in PoseWorker: {e}", exc_info=True)
                 self.state = "INACTIVE"
-                await asyncio.sleep(1)
+                await sleep_unless_shutdown(1)
 
 # --- WebSocketリスナー ---
 async def game_websocket_listener(page: ft.Page, game_status: ft.Text, piston_mode_text: ft.Text, vibe_mode_text: ft.Text, pulsing_manager: PulsingManager):
-    global current_piston_mode, current_vibe_mode, current_pose_id, current_progress, current_animation_hash
+    global current_piston_mode, current_vibe_mode, current_pose_id, current_progress, current_animation_hash, latest_pose_hash
     last_hash_notified = -1
-    while not is_shutting_down:
+    retry_delay = RETRY_INITIAL_DELAY
+    while not shutdown_event.is_set():
         try:
             game_status.value = "Waiting..."; game_status.color = ft.Colors.YELLOW
             pulsing_manager.add(game_status)
-            async with websockets.connect(config.GAME_WS_URL) as websocket:
+            async with websockets.connect(config.GAME_WS_URL, compression=None, max_size=2**16, max_queue=8,
+                                          write_limit=65536, ping_interval=20, ping_timeout=10) as websocket:
                 pulsing_manager.remove(game_status)
                 logging.info(f"Connected to GameMOD ({config.GAME_WS_URL})")
                 game_status.value = "Connected"; game_status.color = ft.Colors.GREEN
                 page.update()
-                async for message in websocket:
-                    data = json.loads(message)
+                retry_delay = RETRY_INITIAL_DELAY
+                while True:
+                    # テキストフレームも str にデコードせず bytes のまま orjson に渡す
+                    try:
+                        message = await websocket.recv(decode=False)
+                    except websockets.ConnectionClosed:
+                        break
+                    data = orjson.loads(message)
+                    new_piston_mode = data.get("piston", 0)
+                    new_vibe_mode = data.get("vibe", 0)
 
-                    current_piston_mode = data.get("piston", 0)
-                    current_vibe_mode = data.get("vibe", 0)
                     current_progress = data.get("progress", 0.0)
-                    current_animation_hash = data.get("animation_hash", 0)
                     new_hash = data.get("animation_hash", 0)
 
+                    is_state_changed = False
                     if new_hash != last_hash_notified:
-                        event = {'type': 'POSE_CHANGED', 'hash': new_hash}
-                        await pose_event_queue.put(event)
-                        logging.info(f"EVENT QUEUED: Pose changed to {new_hash}")
+                        latest_pose_hash = new_hash
+                        pose_changed_event.set()
+                        logging.info(f"EVENT: Pose changed to {new_hash}")
                         last_hash_notified = new_hash
+                        is_state_changed = True
 
                     current_animation_hash = new_hash
 
-                    piston_mode_text.value = f"Piston Mode: {current_piston_mode}"
-                    vibe_mode_text.value = f"Vibe Mode: {current_vibe_mode}"
-                    page.update()
+                    if new_piston_mode != current_piston_mode:
+                        piston_mode_text.value = f"Piston Mode: {new_piston_mode}"
+                        ui_scheduler.mark_dirty(piston_mode_text)
+                        current_piston_mode = new_piston_mode
+                        piston_mode_event.set()
+                        is_state_changed = True
+                    if new_vibe_mode != current_vibe_mode:
+                        vibe_mode_text.value = f"Vibe Mode: {new_vibe_mode}"
+                        ui_scheduler.mark_dirty(vibe_mode_text)
+                        current_vibe_mode = new_vibe_mode
+                        vibe_mode_event.set()
+                        is_state_changed = True
+                    if is_state_changed: update_activity_events()
         except asyncio.CancelledError: break
-        except Exception: logging.warning(f"Failed to connect to the game mod. Retrying in 5 seconds."); await asyncio.sleep(1)
+        except Exception:
+            logging.warning(f"Failed to connect to the game mod. Retrying in {retry_delay:.0f} seconds.")
+            retry_delay = await backoff_sleep(retry_delay)
     pulsing_manager.remove(game_status)
 
+# --- デバッグ用モック ---
+class MockActuator:
+    def __init__(self):
+        self._last_sig = None
+
+    async def command(self, *args, position=None, duration=None):
+        # 振動は強さを位置引数で、リニアは position/duration をキーワードで渡すので、既知の3つをそのまま並べて比較する
+        sig = (args, position, duration)
+        if sig != self._last_sig:
+            logging.info(f"MockActuator received command: {args}, position={position}, duration={duration}")
+            self._last_sig = sig
+
+class MockDevice:
+    def __init__(self, name, index, actuators, linear_actuators):
+        self.name, self.index, self.actuators, self.linear_actuators = name, index, actuators, linear_actuators
+
 # --- Intiface/UI管理 ---
+class NotifyingClient(Client):
+    # buttplug-py の Client はデバイスの追加/削除を通知しないので、メッセージ処理の前後でデバイス一覧を比較して Event で知らせる
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.devices_changed = asyncio.Event()
+
+    async def _handle_message(self, message):
+        before = set(self._devices)
+        await super()._handle_message(message)
+        if before != self._devices.keys(): self.devices_changed.set()
+
+    async def scan_until_settled(self, timeout: float = 3.0, quiet: float = 0.5):
+        # デバイスが見つかってから quiet 秒追加がなければ、timeout を待たずにスキャンを終える
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self.devices_changed.clear()
+        await self.start_scanning()
+        try:
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    await asyncio.wait_for(self.devices_changed.wait(), timeout=min(quiet, remaining) if self._devices else remaining)
+                except asyncio.TimeoutError:
+                    if self._devices: break
+                    continue
+                self.devices_changed.clear()
+        finally:
+            await self.stop_scanning()
+
+# Flet のコントロールは親を1つしか持てないので、ラジオはグループごとに (index, name) をキーに使い回す
+radio_cache = {"piston": {}, "vibe": {}}
+
+def cached_radio(role, index, label):
+    radio = radio_cache[role].get((index, label))
+    if radio is None: radio = radio_cache[role][(index, label)] = ft.Radio(value=str(index), label=label)
+    return radio
+
 async def intiface_manager(page: ft.Page, intiface_status: ft.Text, game_status: ft.Text, piston_selection_group: ft.RadioGroup, vibe_selection_group: ft.RadioGroup, game_listener_args: tuple, pulsing_manager: PulsingManager, ui_elements: dict):
     global cli, managed_devices
+    last_ids = None
+
+    def show_device_status():
+        if not managed_devices: intiface_status.value = "No usable devices found"; intiface_status.color = ft.Colors.ORANGE
+        else: intiface_status.value = "Device connected"; intiface_status.color = ft.Colors.GREEN
 
     async def rescan_and_update_ui():
+        global managed_devices
+        nonlocal last_ids
         intiface_status.value = "Scanning for devices..."; intiface_status.color = ft.Colors.BLUE
         pulsing_manager.add(intiface_status)
         
         if not config.DEBUG_MODE:
-            await cli.start_scanning(); await asyncio.sleep(3); await cli.stop_scanning()
+            await cli.scan_until_settled()
         else:
             await asyncio.sleep(1)
 
         pulsing_manager.remove(intiface_status)
-        managed_devices.clear()
+        new_devices = {}
 
         if not config.DEBUG_MODE:
             for device in cli.devices.values():
                 if device.removed: continue
-                caps = []
-                if hasattr(device, 'linear_actuators') and device.linear_actuators: caps.append('piston')
-                if hasattr(device, 'actuators') and device.actuators: caps.append('vibe')
-                if caps: managed_devices[device.index] = {"device": device, "name": device.name, "capabilities": caps}
+                caps = set()
+                if getattr(device, 'linear_actuators', None): caps.add('piston')
+                if getattr(device, 'actuators', None): caps.add('vibe')
+                if caps: new_devices[device.index] = {"device": device, "name": device.name, "capabilities": frozenset(caps)}
         
         if config.DEBUG_MODE:
             logging.warning("デバッグモード有効: 偽のデバイスを注入します。")
-            class MockActuator:
-                def __init__(self):
-                    self.last_args = object()
-                    self.last_kwargs = object()
-
-                async def command(self, *args, **kwargs):
-                    if args != self.last_args or kwargs != self.last_kwargs:
-                        logging.info(f"MockActuator received command: {args}, {kwargs}")
-                        self.last_args = args
-                        self.last_kwargs = kwargs
-                    pass
-                
-            class MockDevice:
-                def __init__(self, name, index, actuators, linear_actuators):
-                    self.name, self.index, self.actuators, self.linear_actuators = name, index, actuators, linear_actuators
-
             fake_vibe_device = MockDevice("Fake Vibe Device", 99, [MockActuator()], [])
-            managed_devices[99] = {"device": fake_vibe_device, "name": fake_vibe_device.name, "capabilities": ["vibe"]}
+            new_devices[99] = {"device": fake_vibe_device, "name": fake_vibe_device.name, "capabilities": frozenset({"vibe"})}
             fake_piston_device = MockDevice("Fake Piston Device", 98, [], [MockActuator()])
-            managed_devices[98] = {"device": fake_piston_device, "name": fake_piston_device.name, "capabilities": ["piston"]}
+            new_devices[98] = {"device": fake_piston_device, "name": fake_piston_device.name, "capabilities": frozenset({"piston"})}
             #fake_dual_device = MockDevice("Fake Dual Device", 97, [MockActuator()], [MockActuator()])
-            #managed_devices[97] = {"device": fake_dual_device, "name": fake_dual_device.name, "capabilities": ["vibe", "piston"]}
+            #new_devices[97] = {"device": fake_dual_device, "name": fake_dual_device.name, "capabilities": frozenset({"vibe", "piston"})}
+
+        # デバイス構成が前回と同じなら、ラジオの作り直しも割り当てのリセットも行わない
+        new_ids = (frozenset(i for i, info in new_devices.items() if 'piston' in info['capabilities']),
+                   frozenset(i for i, info in new_devices.items() if 'vibe' in info['capabilities']))
+        if new_ids == last_ids:
+            show_device_status(); intiface_status.update()
+            return
+        last_ids = new_ids
+        # clear() してから詰め直すと、スレッドで動く UI ハンドラが空の辞書を見る瞬間ができるので、新しい辞書に差し替える
+        managed_devices = new_devices
         
+        current_keys = {(index, info['name']) for index, info in managed_devices.items()}
+        for cache in radio_cache.values():
+            for key in cache.keys() - current_keys: del cache[key]
+
         piston_radios = []
+        vibe_radios = []
         for index, info in managed_devices.items():
+            label = info['name']
             if 'piston' in info['capabilities']:
-                piston_radios.append(ft.Radio(value=str(index), label=info['name']))
+                piston_radios.append(cached_radio("piston", index, label))
+            vibe_radios.append(cached_radio("vibe", index, label))
         piston_selection_group.content.controls = piston_radios if piston_radios else [ft.Text("No piston devices found.")]
-        
-        vibe_radios = []
-        for index, info in managed_devices.items():
-            vibe_radios.append(ft.Radio(value=str(index), label=info['name']))
         vibe_selection_group.content.controls = vibe_radios if vibe_radios else [ft.Text("No devices found.")]
         
         piston_selection_group.value = None; vibe_selection_group.value = None
         signal_assignments["piston"] = None; signal_assignments["vibe"] = None
-        if not managed_devices: intiface_status.value = "No usable devices found"; intiface_status.color = ft.Colors.ORANGE
-        else: intiface_status.value = "Device connected"; intiface_status.color = ft.Colors.GREEN
+        mark_assignments_changed()
+        show_device_status()
         page.update()
 
     if config.DEBUG_MODE:
@@ -754,75 +1104,74 @@ async def intiface_manager(page: ft.Page, intiface_status: ft.Text, game_status:
         
         await rescan_and_update_ui()
         
-        piston_task = asyncio.create_task(piston_worker())
-        vibe_task = asyncio.create_task(vibe_worker())
-        game_task = asyncio.create_task(game_websocket_listener(*game_listener_args, pulsing_manager))
-
-        debug_workers = {piston_task, vibe_task, game_task}
-        background_tasks.update(debug_workers)
-
-        await asyncio.gather(*debug_workers)
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(piston_worker())
+            tg.create_task(vibe_worker())
+            tg.create_task(game_websocket_listener(*game_listener_args, pulsing_manager))
         return
 
     is_retrying = False
-    while not is_shutting_down:
-        active_workers = set()
-        piston_task, vibe_task, pose_task, climax_task, game_task, scanner_task = None, None, None, None, None, None
+    retry_delay = RETRY_INITIAL_DELAY
+    while not shutdown_event.is_set():
         try:
-            cli = Client("Python Bridge")
+            cli = NotifyingClient("Python Bridge")
             if not is_retrying:
                 intiface_status.value = "Connecting..."; intiface_status.color = ft.Colors.YELLOW
                 pulsing_manager.add(intiface_status)
             connector = WebsocketConnector(config.INTIFACE_WS_URL); await cli.connect(connector)
-            is_retrying = False; pulsing_manager.remove(intiface_status)
+            is_retrying = False; retry_delay = RETRY_INITIAL_DELAY; pulsing_manager.remove(intiface_status)
             intiface_status.value = "Connected"; intiface_status.color = ft.Colors.GREEN
             page.update()
 
             await rescan_and_update_ui()
-            piston_task = asyncio.create_task(piston_worker())
-            vibe_task = asyncio.create_task(vibe_worker())
-            pose_worker_instance = PoseWorker()
-            pose_task = asyncio.create_task(pose_worker_instance.run())
-            climax_task = asyncio.create_task(climax_worker())
-            game_task = asyncio.create_task(game_websocket_listener(*game_listener_args, pulsing_manager))
-            idle_task = asyncio.create_task(idle_worker())
 
             async def periodic_scanner():
-                known_device_ids = set(d.index for d in cli.devices.values() if not d.removed)
+                known_device_ids = frozenset(d.index for d in cli.devices.values() if not d.removed)
                 while True:
-                    await asyncio.sleep(10)
-                    if not cli or not cli.connected: continue
-                    await cli.start_scanning(); await asyncio.sleep(2); await cli.stop_scanning()
-                    current_device_ids = set(d.index for d in cli.devices.values() if not d.removed)
+                    # 削除やスキャン中の追加は即座に拾い、新しいデバイスを見つけるためのスキャンは従来どおり10秒ごとに行う
+                    try:
+                        await asyncio.wait_for(cli.devices_changed.wait(), timeout=10)
+                    except asyncio.TimeoutError:
+                        if not cli or not cli.connected: continue
+                        await cli.start_scanning(); await asyncio.sleep(2); await cli.stop_scanning()
+                    cli.devices_changed.clear()
+                    current_device_ids = frozenset(d.index for d in cli.devices.values() if not d.removed)
                     if current_device_ids != known_device_ids:
                         logging.info("デバイスリストが変更されました。UIを更新します。"); await rescan_and_update_ui()
                         known_device_ids = current_device_ids
             
-            scanner_task = asyncio.create_task(periodic_scanner())
-            new_workers = {piston_task, vibe_task, pose_task, climax_task, game_task, scanner_task, idle_task}
-            active_workers.update(new_workers); background_tasks.update(new_workers)
-            await asyncio.gather(*new_workers)
+            # いずれかのワーカーが例外で落ちるか、この関数がキャンセルされると、グループ内の全ワーカーがまとめてキャンセルされる
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(piston_worker())
+                tg.create_task(vibe_worker())
+                tg.create_task(PoseWorker().run())
+                tg.create_task(climax_worker())
+                tg.create_task(game_websocket_listener(*game_listener_args, pulsing_manager))
+                tg.create_task(idle_worker())
+                tg.create_task(periodic_scanner())
 
         except asyncio.CancelledError: break
-        except Exception as e: logging.error(f"Intiface manager : {e}")
+        except Exception as e:
+            errors = e.exceptions if isinstance(e, ExceptionGroup) else (e,)
+            for err in errors: logging.error(f"Intiface manager : {err}")
         finally:
-            for task in active_workers:
-                if not task.done(): task.cancel()
-            await asyncio.gather(*active_workers, return_exceptions=True)
-            background_tasks.difference_update(active_workers)
-            if not is_shutting_down:
-                is_retrying = True
+            if not shutdown_event.is_set():
+                is_retrying = True; last_ids = None
                 intiface_status.value = "Disconnected. Retrying..."; intiface_status.color = ft.Colors.ORANGE
                 game_status.value = "Paused (Waiting for Intiface)..."; game_status.color = ft.Colors.YELLOW
                 pulsing_manager.add(intiface_status, game_status)
                 piston_selection_group.content.controls = [ft.Text("Waiting for Intiface...")]
                 vibe_selection_group.content.controls = [ft.Text("Waiting for Intiface...")]
                 page.update()
-                await asyncio.sleep(3)
+                retry_delay = await backoff_sleep(retry_delay)
 
 
 async def main(page: ft.Page):
+    # Python 3.12以降ではタスクを生成時に即実行させ、最初のawaitまでのスケジューリング往復を省く
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
     load_config()
+    update_activity_events()
     page.title = "Toy Controller"
     page.window.width = 650; page.window.height = 1000
     page.window.maximizable = False
@@ -830,8 +1179,9 @@ async def main(page: ft.Page):
     page.scroll = None 
     page.padding = 20
 
-    global page_ref, piston_gauge_ref, vibe_gauge_ref
+    global page_ref, ui_scheduler, piston_gauge_ref, vibe_gauge_ref
     page_ref = page
+    ui_scheduler = UIUpdateScheduler(page)
 
     piston_gauge = ft.ProgressBar(value=0, width=280, color=ft.Colors.LIGHT_BLUE_ACCENT, bgcolor="#eeeeee")
     vibe_gauge = ft.ProgressBar(value=0, width=280, color=ft.Colors.PINK_ACCENT, bgcolor="#eeeeee")
@@ -906,7 +1256,7 @@ async def main(page: ft.Page):
     pose_selector = ft.Dropdown(
         label="Motion",
         options=[
-            ft.dropdown.Option(key=str(pose_id), text=profile["name"])
+            ft.dropdown.Option(key=str(pose_id), text=profile.name)
             for pose_id, profile in config.POSE_PROFILES.items()
         ],
     )
@@ -918,8 +1268,8 @@ async def main(page: ft.Page):
     def on_idle_switch_change(e):
         global is_idle_motion_enabled
         is_idle_motion_enabled = e.control.value
+        page.loop.call_soon_threadsafe(update_activity_events)
         logging.info(f"Idle motion toggled: {is_idle_motion_enabled}")
-        page.update()
 
     idle_switch = ft.Switch(label="Filler Interval", value=is_idle_motion_enabled, on_change=on_idle_switch_change)
 
@@ -928,11 +1278,12 @@ async def main(page: ft.Page):
     def on_slider_change_display_only(e):
         new_interval = round(e.control.value, 1)
         idle_interval_text.value = f": {new_interval:.1f}s"
-        page.update()
+        ui_scheduler.mark_dirty_threadsafe(idle_interval_text)
 
     def on_slider_drag_start(e):
         global is_slider_dragging
         is_slider_dragging = True
+        page.loop.call_soon_threadsafe(update_activity_events)
         logging.info("Slider drag started, pausing motion.")
 
     def on_slider_drag_end(e):
@@ -942,6 +1293,7 @@ async def main(page: ft.Page):
         idle_motion_interval = new_interval
         
         is_slider_dragging = False
+        page.loop.call_soon_threadsafe(update_activity_events)
         logging.info(f"Slider drag ended, resuming motion with interval: {new_interval}s")
 
     idle_interval_slider = ft.Slider(
@@ -950,20 +1302,20 @@ async def main(page: ft.Page):
         divisions=5.5,
         value=idle_motion_interval,
         width=200,
-        on_change=on_slider_change_display_only,
+        on_change=Throttle(on_slider_change_display_only),
         on_change_start=on_slider_drag_start,
         on_change_end=on_slider_drag_end
     )
 
     def save_on_change_end(e):
-        save_config()
+        schedule_save()
 
     def on_pose_selected(e):
         selected_id = int(e.control.value)
         profile = config.POSE_PROFILES[selected_id]
         
-        min_val = profile.get("min_pos", 0.0)
-        max_val = profile.get("max_pos", 1.0)
+        min_val = profile.min_pos
+        max_val = profile.max_pos
         
         pose_min_pos_text.value = f"Min Position: {min_val:.2f}"
         pose_min_pos_slider.value = min_val
@@ -978,52 +1330,45 @@ async def main(page: ft.Page):
     def on_pose_slider_change(e, slider_type):
         if not pose_selector.value: return
         
-        selected_id = int(pose_selector.value)
+        profile = config.POSE_PROFILES[int(pose_selector.value)]
         new_value = round(e.control.value, 2)
         
         if slider_type == "min":
-            current_max = config.POSE_PROFILES[selected_id]["max_pos"]
+            current_max = profile.max_pos
             if new_value > current_max:
                 new_value = current_max
                 e.control.value = new_value
-            config.POSE_PROFILES[selected_id]["min_pos"] = new_value
+                ui_scheduler.mark_dirty_threadsafe(e.control)
+            profile.min_pos = new_value
             pose_min_pos_text.value = f"Min Position: {new_value:.2f}"
+            ui_scheduler.mark_dirty_threadsafe(pose_min_pos_text)
         else:
-            current_min = config.POSE_PROFILES[selected_id]["min_pos"]
+            current_min = profile.min_pos
             if new_value < current_min:
                 new_value = current_min
                 e.control.value = new_value
-            config.POSE_PROFILES[selected_id]["max_pos"] = new_value
+                ui_scheduler.mark_dirty_threadsafe(e.control)
+            profile.max_pos = new_value
             pose_max_pos_text.value = f"Max Position: {new_value:.2f}"
-        
-        page.update()
+            ui_scheduler.mark_dirty_threadsafe(pose_max_pos_text)
+
+    # 振動レンジ欄の (height, opacity)
+    VIBE_RANGE_SHOWN, VIBE_RANGE_HIDDEN = (215, 1), (0, 0)
 
     def _check_and_update_vibe_range_ui():
         
         #logging.info(f"UI Vibility Check: Piston={signal_assignments.get('piston')}, Vibe={signal_assignments.get('vibe')}")
         
-        piston_idx = signal_assignments.get("piston")
-        vibe_idx = signal_assignments.get("vibe")
-
-        show_vibe_range = False
+        vibe_idx = signal_assignments["vibe"]
+        vibe_device_info = managed_devices.get(vibe_idx) if vibe_idx is not None and signal_assignments["piston"] == vibe_idx else None
+        show_vibe_range = vibe_device_info is not None and 'vibe' in vibe_device_info["capabilities"]
 
-        if vibe_idx is not None and piston_idx is not None and piston_idx == vibe_idx:
-            vibe_device_info = managed_devices.get(vibe_idx, {})
-            vibe_capabilities = vibe_device_info.get("capabilities", [])
-            if 'vibe' in vibe_capabilities:
-                show_vibe_range = True
-
-        if show_vibe_range:
-            vibe_range_container.height = 215
-            vibe_range_container.opacity = 1
-        else:
-            vibe_range_container.height = 0
-            vibe_range_container.opacity = 0
+        vibe_range_container.height, vibe_range_container.opacity = VIBE_RANGE_SHOWN if show_vibe_range else VIBE_RANGE_HIDDEN
 
     def on_piston_device_selected(e):
         selected_index = int(e.control.value)
         device_info = managed_devices.get(selected_index, {})
-        capabilities = device_info.get("capabilities", [])
+        capabilities = device_info.get("capabilities", _EMPTY_CAPS)
         
         is_exclusive = 'piston' in capabilities and 'vibe' not in capabilities
         
@@ -1045,13 +1390,14 @@ async def main(page: ft.Page):
             vibe_2_text.value = f"Mode 2 (High) Strength: {config.VIBE_STRENGTH_MAP[2]:.1f}"
             range_container.height = 0; range_container.opacity = 0
         
+        mark_assignments_changed()
         _check_and_update_vibe_range_ui()
         page.update()
 
     def on_vibe_device_selected(e):
         selected_index = int(e.control.value)
         device_info = managed_devices.get(selected_index, {})
-        capabilities = device_info.get("capabilities", [])
+        capabilities = device_info.get("capabilities", _EMPTY_CAPS)
         
         is_piston_only = 'piston' in capabilities and 'vibe' not in capabilities
         
@@ -1083,121 +1429,117 @@ async def main(page: ft.Page):
             range_container.opacity = 0
 
         new_piston_radios = []
+        valid_piston_values = set()
         current_piston_selection_value = piston_selection_group.value
 
         for index, info in managed_devices.items():
             if 'piston' in info['capabilities'] or index == selected_index:
-                new_piston_radios.append(ft.Radio(value=str(index), label=info['name']))
+                radio = cached_radio("piston", index, info['name'])
+                new_piston_radios.append(radio); valid_piston_values.add(radio.value)
 
-        piston_selection_group.content.controls = new_piston_radios
+        # キャッシュ済みのラジオを使っているので、並びが同じなら差し替え自体を省く
+        if new_piston_radios != piston_selection_group.content.controls:
+            piston_selection_group.content.controls = new_piston_radios
 
-        valid_piston_values = [radio.value for radio in new_piston_radios]
         if current_piston_selection_value in valid_piston_values:
             piston_selection_group.value = current_piston_selection_value
         else:
             piston_selection_group.value = None
             signal_assignments["piston"] = None
 
+        mark_assignments_changed()
         _check_and_update_vibe_range_ui()
         page.update()
 
+    vibe_texts = {1: vibe_1_text, 2: vibe_2_text}
+    vibe_min_texts = {1: vibe_min_1_text, 2: vibe_min_2_text}
+    vibe_min_sliders = {1: vibe_min_1_slider, 2: vibe_min_2_slider}
+
     def on_vibe_min_strength_slider_change(e, mode):
         new_min = round(e.control.value, 2)
         if new_min > config.VIBE_STRENGTH_MAP[mode]:
             new_min = config.VIBE_STRENGTH_MAP[mode]
             e.control.value = new_min
+            ui_scheduler.mark_dirty_threadsafe(e.control)
+        if new_min == config.VIBE_MIN_STRENGTH_MAP[mode]: return
 
         config.VIBE_MIN_STRENGTH_MAP[mode] = new_min
-        if mode == 1:
-            vibe_min_1_text.value = f"Mode 1 Min Strength: {new_min:.1f}"
-        else:
-            vibe_min_2_text.value = f"Mode 2 Min Strength: {new_min:.1f}"
-        page.update()    
+        vibe_min_text = vibe_min_texts[mode]
+        vibe_min_text.value = f"Mode {mode} Min Strength: {new_min:.1f}"
+        ui_scheduler.mark_dirty_threadsafe(vibe_min_text)
 
     piston_selection_group.on_change = on_piston_device_selected
     vibe_selection_group.on_change = on_vibe_device_selected
 
-    def save_on_change_end(e): save_config()
+    speed_texts = {1: speed_1_text, 2: speed_2_text, 3: speed_3_text}
 
     def on_speed_slider_change(e, mode):
-        config.PISTON_SPEED_MAP[mode] = round(e.control.value, 1)
-        speed_1_text.value = f"Mode 1 (Low) Interval: {config.PISTON_SPEED_MAP[1]:.1f}s"
-        speed_2_text.value = f"Mode 2 (Medium) Interval: {config.PISTON_SPEED_MAP[2]:.1f}s"
-        speed_3_text.value = f"Mode 3 (High) Interval: {config.PISTON_SPEED_MAP[3]:.1f}s"
-        page.update()
+        new_val = round(e.control.value, 1)
+        # 表示上の値(.1f)が変わらないならテキスト更新もUI差分も不要
+        if new_val == config.PISTON_SPEED_MAP[mode]: return
+        config.PISTON_SPEED_MAP[mode] = new_val
+        speed_text = speed_texts[mode]
+        speed_text.value = _speed_fmt(m=mode, tier=PISTON_SPEED_TIERS[mode], v=new_val)
+        ui_scheduler.mark_dirty_threadsafe(speed_text)
+
+    def update_range_piston(new_min, new_max):
+        config.piston_pos_min = new_min; config.piston_pos_max = new_max
+        min_pos_slider_piston.value = new_min; max_pos_slider_piston.value = new_max
+        min_pos_text_piston.value = f"Min Position: {new_min:.2f}"
+        max_pos_text_piston.value = f"Max Position: {new_max:.2f}"
+        ui_scheduler.mark_dirty_threadsafe(min_pos_slider_piston, max_pos_slider_piston, min_pos_text_piston, max_pos_text_piston)
 
     def on_min_pos_change_piston(e):
         new_min = round(e.control.value, 2)
-        if new_min > config.piston_pos_max:
-            config.piston_pos_max = new_min
-            max_pos_slider_piston.value = new_min
-            max_pos_text_piston.value = f"Max Position: {new_min:.2f}"
-        config.piston_pos_min = new_min
-        min_pos_text_piston.value = f"Min Position: {new_min:.2f}"
-        page.update()
+        update_range_piston(new_min, max(new_min, config.piston_pos_max))
 
     def on_max_pos_change_piston(e):
         new_max = round(e.control.value, 2)
-        if new_max < config.piston_pos_min:
-            config.piston_pos_min = new_max
-            min_pos_slider_piston.value = new_max
-            min_pos_text_piston.value = f"Min Position: {new_max:.2f}"
-        config.piston_pos_max = new_max
-        max_pos_text_piston.value = f"Max Position: {new_max:.2f}"
-        page.update()
+        update_range_piston(min(new_max, config.piston_pos_min), new_max)
+
+    def update_range_vibe(new_min, new_max):
+        config.vibe_as_piston_pos_min = new_min; config.vibe_as_piston_pos_max = new_max
+        min_pos_slider_vibe.value = new_min; max_pos_slider_vibe.value = new_max
+        min_pos_text_vibe.value = f"Min Position: {new_min:.2f}"
+        max_pos_text_vibe.value = f"Max Position: {new_max:.2f}"
+        ui_scheduler.mark_dirty_threadsafe(min_pos_slider_vibe, max_pos_slider_vibe, min_pos_text_vibe, max_pos_text_vibe)
 
     def on_min_pos_change_vibe(e):
         new_min = round(e.control.value, 2)
-        if new_min > config.vibe_as_piston_pos_max:
-            config.vibe_as_piston_pos_max = new_min
-            max_pos_slider_vibe.value = new_min
-            max_pos_text_vibe.value = f"Max Position: {new_min:.2f}"
-        config.vibe_as_piston_pos_min = new_min
-        min_pos_text_vibe.value = f"Min Position: {new_min:.2f}"
-        page.update()
+        update_range_vibe(new_min, max(new_min, config.vibe_as_piston_pos_max))
 
     def on_max_pos_change_vibe(e):
         new_max = round(e.control.value, 2)
-        if new_max < config.vibe_as_piston_pos_min:
-            config.vibe_as_piston_pos_min = new_max
-            min_pos_slider_vibe.value = new_max
-            min_pos_text_vibe.value = f"Min Position: {new_max:.2f}"
-        config.vibe_as_piston_pos_max = new_max
-        max_pos_text_vibe.value = f"Max Position: {new_max:.2f}"
-        page.update()
+        update_range_vibe(min(new_max, config.vibe_as_piston_pos_min), new_max)
 
     def on_vibe_settings_slider_change(e, mode):
         if "Speed" in vibe_settings_title.value:
-            config.VIBE_AS_PISTON_SPEED_MAP[mode] = round(e.control.value, 1)
-            if mode == 1:
-                vibe_1_text.value = f"Mode 1 (Low) Interval: {config.VIBE_AS_PISTON_SPEED_MAP[1]:.1f}s"
-            else:
-                vibe_2_text.value = f"Mode 2 (High) Interval: {config.VIBE_AS_PISTON_SPEED_MAP[2]:.1f}s"
+            new_val = round(e.control.value, 1)
+            if new_val == config.VIBE_AS_PISTON_SPEED_MAP.get(mode): return
+            config.VIBE_AS_PISTON_SPEED_MAP[mode] = new_val
+            vibe_text = vibe_texts[mode]
+            vibe_text.value = _speed_fmt(m=mode, tier=VIBE_TIERS[mode], v=new_val)
+            ui_scheduler.mark_dirty_threadsafe(vibe_text)
         else:
             new_max_strength = round(e.control.value, 2)
+            if new_max_strength == config.VIBE_STRENGTH_MAP[mode]: return
             config.VIBE_STRENGTH_MAP[mode] = new_max_strength
-            if mode == 1:
-                vibe_1_text.value = f"Mode 1 (Low) Strength: {new_max_strength:.1f}"
-            else:
-                vibe_2_text.value = f"Mode 2 (High) Strength: {new_max_strength:.1f}"
+            vibe_text = vibe_texts[mode]
+            vibe_text.value = f"Mode {mode} ({VIBE_TIERS[mode]}) Strength: {new_max_strength:.1f}"
+            ui_scheduler.mark_dirty_threadsafe(vibe_text)
 
             current_min_strength = config.VIBE_MIN_STRENGTH_MAP.get(mode)
             if current_min_strength > new_max_strength:
                 config.VIBE_MIN_STRENGTH_MAP[mode] = new_max_strength
-
-                if mode == 1:
-                    vibe_min_1_slider.value = new_max_strength
-                    vibe_min_1_text.value = f"Mode 1 Min Strength: {new_max_strength:.1f}"
-                else:
-                    vibe_min_2_slider.value = new_max_strength
-                    vibe_min_2_text.value = f"Mode 2 Min Strength: {new_max_strength:.1f}"
-        page.update()
+                vibe_min_slider, vibe_min_text = vibe_min_sliders[mode], vibe_min_texts[mode]
+                vibe_min_slider.value = new_max_strength
+                vibe_min_text.value = f"Mode {mode} Min Strength: {new_max_strength:.1f}"
+                ui_scheduler.mark_dirty_threadsafe(vibe_min_slider, vibe_min_text)
 
     def on_wireless_mode_change(e):
         global is_wireless_mode
         is_wireless_mode = e.control.value
         logging.info(f"Wireless device mode toggled: {is_wireless_mode}")
-        page.update()
 
     wireless_switch = ft.Switch(
         label="Bluetooth Device",
@@ -1205,20 +1547,20 @@ async def main(page: ft.Page):
         on_change=on_wireless_mode_change
     )
 
-    speed_1_slider.on_change = lambda e: on_speed_slider_change(e, 1)
-    speed_2_slider.on_change = lambda e: on_speed_slider_change(e, 2)
-    speed_3_slider.on_change = lambda e: on_speed_slider_change(e, 3)
-    min_pos_slider_piston.on_change = on_min_pos_change_piston
-    max_pos_slider_piston.on_change = on_max_pos_change_piston
-    min_pos_slider_vibe.on_change = on_min_pos_change_vibe
-    max_pos_slider_vibe.on_change = on_max_pos_change_vibe
-    vibe_1_slider.on_change = lambda e: on_vibe_settings_slider_change(e, 1)
-    vibe_2_slider.on_change = lambda e: on_vibe_settings_slider_change(e, 2)
-    vibe_min_1_slider.on_change = lambda e: on_vibe_min_strength_slider_change(e, 1)
-    vibe_min_2_slider.on_change = lambda e: on_vibe_min_strength_slider_change(e, 2)
+    speed_1_slider.on_change = Throttle(functools.partial(on_speed_slider_change, mode=1))
+    speed_2_slider.on_change = Throttle(functools.partial(on_speed_slider_change, mode=2))
+    speed_3_slider.on_change = Throttle(functools.partial(on_speed_slider_change, mode=3))
+    min_pos_slider_piston.on_change = Throttle(on_min_pos_change_piston)
+    max_pos_slider_piston.on_change = Throttle(on_max_pos_change_piston)
+    min_pos_slider_vibe.on_change = Throttle(on_min_pos_change_vibe)
+    max_pos_slider_vibe.on_change = Throttle(on_max_pos_change_vibe)
+    vibe_1_slider.on_change = Throttle(functools.partial(on_vibe_settings_slider_change, mode=1))
+    vibe_2_slider.on_change = Throttle(functools.partial(on_vibe_settings_slider_change, mode=2))
+    vibe_min_1_slider.on_change = Throttle(functools.partial(on_vibe_min_strength_slider_change, mode=1))
+    vibe_min_2_slider.on_change = Throttle(functools.partial(on_vibe_min_strength_slider_change, mode=2))
     pose_selector.on_change = on_pose_selected
-    pose_min_pos_slider.on_change = lambda e: on_pose_slider_change(e, "min")
-    pose_max_pos_slider.on_change = lambda e: on_pose_slider_change(e, "max")
+    pose_min_pos_slider.on_change = Throttle(functools.partial(on_pose_slider_change, slider_type="min"))
+    pose_max_pos_slider.on_change = Throttle(functools.partial(on_pose_slider_change, slider_type="max"))
     
     all_sliders = [
         speed_1_slider, speed_2_slider, speed_3_slider,
@@ -1277,7 +1619,7 @@ async def main(page: ft.Page):
                             ),
                             wireless_switch
                         ]),
-                        padding=ft.padding.only(left=15, top=10, right=15, bottom=10)
+                        padding=CARD_PADDING
                     )
                 ),
 
@@ -1333,27 +1675,59 @@ async def main(page: ft.Page):
         )
     )
 
-    async def on_disconnect_handler(e):
-        global cli, is_shutting_down
-        if is_shutting_down: return
-        is_shutting_down = True; logging.info("Saving final configuration."); save_config()
-        logging.info("Disconnect event received. Starting cleanup process."); pulsing_manager.clear()
-        tasks_to_cancel = list(background_tasks)
-        for task in tasks_to_cancel:
-            if not task.done(): task.cancel()
-        await asyncio.gather(*tasks_to_cancel, return_exceptions=True)
+    shutdown_task = None
+
+    async def teardown_session():
+        # intiface_manager のキャンセルがTaskGroup経由で全ワーカーに伝播する
+        main_task.cancel()
+        await asyncio.gather(main_task, return_exceptions=True)
+        ui_task.cancel()
         if cli and cli.connected:
             try: await cli.disconnect()
+            except asyncio.CancelledError:
+                # ping ループ自身は CancelledError を握りつぶすが、最初のステップ前にキャンセルされた ping タスクは
+                # 本体が走らないため、disconnect() 内の await から CancelledError が出る。その場合だけを握りつぶす
+                if asyncio.current_task().cancelling(): raise
             except Exception as ex: logging.error(f"クリーン切断中のエラー: {ex}")
+
+    async def save_after_pending():
+        # 遅延保存がすでに書き込み中なら、その完了を待ってから最終保存で上書きする
+        if _save_task is not None and not _save_task.done(): await asyncio.wait((_save_task,))
+        await save_config_async()
+
+    async def shutdown_session():
+        shutdown_event.set()
+        if _save_handle: _save_handle.cancel()
+        # 最終保存はスレッドで書き込まれるので、ワーカーの停止と並行して進める。タイムアウトの対象外にして必ず書き切る
+        logging.info("Saving final configuration."); final_save = asyncio.create_task(save_after_pending())
+        logging.info("Disconnect event received. Starting cleanup process."); pulsing_manager.clear()
+        try:
+            await asyncio.wait_for(teardown_session(), timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logging.warning(f"Cleanup did not finish within {SHUTDOWN_TIMEOUT_SECONDS:.0f} seconds. Continuing shutdown.")
+            ui_task.cancel()
+        await final_save
         logging.info("Cleanup complete.")
 
+    async def on_disconnect_handler(e):
+        # 後片付けは1回だけ実行し、重複した切断通知はその完了を待つだけにする。shield で呼び出し元のキャンセルから守る
+        nonlocal shutdown_task
+        if shutdown_task is None: shutdown_task = asyncio.create_task(shutdown_session())
+        await asyncio.shield(shutdown_task)
+
     page.on_disconnect = on_disconnect_handler
     game_args = (page, game_status_value, piston_mode_display, vibe_mode_display)
     manager_args = (page, intiface_status_value, game_status_value, piston_selection_group, vibe_selection_group, game_args, pulsing_manager, ui_elements)
-    main_task = asyncio.create_task(intiface_manager(*manager_args))
-    background_tasks.add(main_task)
-    try: await main_task
-    except asyncio.CancelledError: pass
+    # UI スケジューラと intiface_manager はこのセッションの TaskGroup に属し、main は両方が終わるまで待つ
+    async with asyncio.TaskGroup() as tg:
+        ui_task = tg.create_task(ui_scheduler.run())
+        main_task = tg.create_task(intiface_manager(*manager_args))
 
 if __name__ == "__main__":
+    # uvloop が入っている環境(Windows以外)ではイベントループを差し替える。ft.app は内部で asyncio.run を使うので、その前にポリシーで指定する
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     ft.app(target=main)
\ No newline at end of file
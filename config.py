@@ -1,5 +1,4 @@
 import math
-import time
 
 # --- 設定 ---
 DEBUG_MODE = False
@@ -75,11 +74,6 @@ def pattern_6(progress):
         eased_value = ease_out_quad(sub_progress)
         return eased_value
 
-def pattern_constant_freq(progress):
-    cycle_duration = 0.65
-    internal_progress = (time.monotonic() / cycle_duration) % 1.0
-    return pattern_5(internal_progress)
-
 
 # --- ハッシュ値 ---
 POSE_PROFILES = {